@@ -3,26 +3,49 @@ TechTrove Feedback Service - Flask Implementation with SQLite
 Preserves exact same API endpoints and response formats as the original
 """
  
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import json
 import urllib.parse
 import urllib.request
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
 import sqlite3
+import numpy as np
 import pandas as pd
 import matplotlib
 matplotlib.use('Agg')  # Use non-interactive backend
 import matplotlib.pyplot as plt
 import io
 import base64
- 
+import hashlib
+import math
+import queue
+import threading
+import uuid
+from collections import deque
+
 # Configuration
 PORT = int(os.environ.get('PORT', 8083))
 SERVICE_REGISTRY_URL = os.environ.get('SERVICE_REGISTRY_URL', 'http://localhost:8080')
 DB_PATH = os.environ.get('DB_PATH', 'feedback.db')
 
+# HyperLogLog precision: 2^10 registers (1 KiB per product per day),
+# relative standard error 1.04 / sqrt(2^10) ~= 3.25%
+HLL_PRECISION = 10
+HLL_REGISTERS = 1 << HLL_PRECISION
+HLL_RELATIVE_ERROR = round(1.04 / HLL_REGISTERS ** 0.5, 4)
+RATING_QUANTILES = [0.25, 0.5, 0.75, 0.9, 0.99]
+# Sketch rows merged per numpy batch, bounds memory for long windows
+SKETCH_MERGE_BATCH = 10000
+
+# Review change feed (Server-Sent Events)
+FEED_HISTORY_SIZE = int(os.environ.get('FEED_HISTORY_SIZE', 1000))
+FEED_SUBSCRIBER_BUFFER = int(os.environ.get('FEED_SUBSCRIBER_BUFFER', 100))
+FEED_HEARTBEAT_SECONDS = int(os.environ.get('FEED_HEARTBEAT_SECONDS', 15))
+# Imports larger than this publish per-product aggregates only
+FEED_IMPORT_REVIEW_LIMIT = int(os.environ.get('FEED_IMPORT_REVIEW_LIMIT', 100))
+
 # Initialize Flask application
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
@@ -30,6 +53,18 @@ CORS(app)  # Enable CORS for all routes
 # Variable to store service registry ID
 service_id = None
 
+# In-process pub/sub state for the review change feed
+feed_lock = threading.Lock()
+# Held across commit + publish so events leave in commit order and a later
+# event never carries older aggregates
+feed_publish_lock = threading.Lock()
+feed_history = deque(maxlen=FEED_HISTORY_SIZE)
+feed_subscribers = []
+feed_last_event_id = 0
+# Event ids are "<epoch>-<seq>"; the epoch changes on every restart so
+# clients resuming from an earlier process are told to reset
+feed_epoch = uuid.uuid4().hex[:12]
+
 # Helper function to initialize the database
 def init_db():
     """Create the database tables if they don't exist"""
@@ -50,7 +85,23 @@ def init_db():
         created_at TEXT NOT NULL
     )
     ''')
-    
+
+    # Create per-product, per-day sketches table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS review_sketches (
+        product_id INTEGER NOT NULL,
+        bucket TEXT NOT NULL,
+        reviewers_hll BLOB NOT NULL,
+        rating_counts TEXT NOT NULL,
+        PRIMARY KEY (product_id, bucket)
+    )
+    ''')
+
+    # Backfill sketches for reviews written before the table existed
+    cursor.execute("SELECT COUNT(*) FROM review_sketches")
+    if cursor.fetchone()[0] == 0:
+        rebuild_review_sketches(cursor)
+
     conn.commit()
     conn.close()
     print(f"Database initialized at {DB_PATH}")
@@ -81,9 +132,385 @@ def simple_sentiment_analysis(text, rating):
     else:
         sentiment = "neutral"
         score = 0.0
-       
+
     return score, sentiment
- 
+
+# Helper functions for approximate analytics sketches
+def hll_add(registers, value):
+    """Add a value to a HyperLogLog register array in place"""
+    digest = hashlib.sha1(str(value).encode('utf-8')).digest()
+    hashed = int.from_bytes(digest[:8], 'big')
+    index = hashed >> (64 - HLL_PRECISION)
+    remaining_bits = 64 - HLL_PRECISION
+    remainder = hashed & ((1 << remaining_bits) - 1)
+    rank = remaining_bits - remainder.bit_length() + 1
+    if rank > registers[index]:
+        registers[index] = rank
+
+def hll_merge(target, other):
+    """Merge another HyperLogLog register array into target in place"""
+    target[:] = np.maximum(
+        np.frombuffer(target, dtype=np.uint8),
+        np.frombuffer(other, dtype=np.uint8)
+    ).tobytes()
+
+def hll_estimate(registers):
+    """Estimate the number of distinct values seen by a HyperLogLog"""
+    m = HLL_REGISTERS
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw_estimate = alpha * m * m / np.ldexp(1.0, -np.frombuffer(registers, dtype=np.uint8).astype(int)).sum()
+    zeros = registers.count(0)
+
+    # Small range correction: linear counting is more accurate here
+    if raw_estimate <= 2.5 * m and zeros > 0:
+        return int(round(m * math.log(m / zeros)))
+    return int(round(raw_estimate))
+
+def rating_quantiles(rating_counts):
+    """Nearest-rank quantiles from a 1-5 star rating histogram"""
+    total = sum(rating_counts)
+    quantiles = {}
+    for q in RATING_QUANTILES:
+        rank = max(1, math.ceil(q * total))
+        cumulative = 0
+        for rating, count in enumerate(rating_counts, start=1):
+            cumulative += count
+            if cumulative >= rank:
+                quantiles[f"p{int(q * 100)}"] = rating
+                break
+    return quantiles
+
+def is_whole_number(value):
+    """True for ints and integral floats such as 4.0, False for bools and anything else"""
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, int):
+        return True
+    return isinstance(value, float) and value.is_integer()
+
+def normalize_created_at(value):
+    """ISO 8601 (UTC) form of an imported created_at; now if blank, None if unparseable"""
+    if value is None or pd.isna(value) or str(value).strip() == '':
+        return datetime.utcnow().isoformat()
+    timestamp = pd.to_datetime(value, errors='coerce', utc=True)
+    if pd.isna(timestamp):
+        return None
+    return timestamp.tz_convert(None).isoformat()
+
+def sketch_bucket(created_at):
+    """Day bucket (YYYY-MM-DD) a review belongs to"""
+    return str(created_at)[:10]
+
+def update_review_sketch(cursor, product_id, user_id, rating, created_at):
+    """Fold a single review into its product/day sketch"""
+    bucket = sketch_bucket(created_at)
+    cursor.execute(
+        "SELECT reviewers_hll, rating_counts FROM review_sketches WHERE product_id = ? AND bucket = ?",
+        (product_id, bucket)
+    )
+    row = cursor.fetchone()
+
+    if row:
+        registers = bytearray(row[0])
+        rating_counts = json.loads(row[1])
+    else:
+        registers = bytearray(HLL_REGISTERS)
+        rating_counts = [0, 0, 0, 0, 0]
+
+    # 5 and 5.0 must hash to the same reviewer
+    if is_whole_number(user_id):
+        user_id = int(user_id)
+    hll_add(registers, user_id)
+    if rating in (1, 2, 3, 4, 5):
+        rating_counts[int(rating) - 1] += 1
+
+    cursor.execute('''
+    INSERT OR REPLACE INTO review_sketches (product_id, bucket, reviewers_hll, rating_counts)
+    VALUES (?, ?, ?, ?)
+    ''', (product_id, bucket, bytes(registers), json.dumps(rating_counts)))
+
+def rebuild_review_sketches(cursor):
+    """Recompute all sketches from the reviews table"""
+    cursor.execute("DELETE FROM review_sketches")
+    cursor.execute("SELECT product_id, user_id, rating, created_at FROM reviews")
+    for product_id, user_id, rating, created_at in cursor.fetchall():
+        update_review_sketch(cursor, product_id, user_id, rating, created_at)
+
+def merge_review_sketches(product_ids=None, days=None):
+    """Merge stored sketches across products and/or a trailing window of days"""
+    registers = bytearray(HLL_REGISTERS)
+    rating_counts = [0, 0, 0, 0, 0]
+    if product_ids is not None and not product_ids:
+        return registers, rating_counts
+
+    query = "SELECT reviewers_hll, rating_counts FROM review_sketches WHERE 1 = 1"
+    params = []
+
+    if product_ids is not None:
+        query += f" AND product_id IN ({','.join('?' for _ in product_ids)})"
+        params.extend(product_ids)
+
+    if days is not None:
+        cutoff = (datetime.utcnow() - timedelta(days=days - 1)).date().isoformat()
+        query += " AND bucket >= ?"
+        params.append(cutoff)
+
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute(query, params)
+
+    # Reduce each batch of rows with one vectorised max/sum
+    merged = np.zeros(HLL_REGISTERS, dtype=np.uint8)
+    counts = np.zeros(5, dtype=np.int64)
+    while True:
+        rows = cursor.fetchmany(SKETCH_MERGE_BATCH)
+        if not rows:
+            break
+        blobs = np.frombuffer(b''.join(row[0] for row in rows), dtype=np.uint8)
+        np.maximum(merged, blobs.reshape(len(rows), HLL_REGISTERS).max(axis=0), out=merged)
+        counts += np.array(json.loads('[' + ','.join(row[1] for row in rows) + ']')).sum(axis=0)
+    conn.close()
+
+    return bytearray(merged.tobytes()), counts.tolist()
+
+def sketch_analytics_response(registers, rating_counts, days):
+    """Build the JSON body shared by the sketch analytics endpoints"""
+    return {
+        'window_days': days,
+        'total_reviews': sum(rating_counts),
+        'distinct_reviewers': {
+            'estimate': hll_estimate(registers),
+            'relative_standard_error': HLL_RELATIVE_ERROR
+        },
+        'rating_quantiles': rating_quantiles(rating_counts),
+        'rating_quantiles_error': 0
+    }
+
+def parse_window_days():
+    """Read the optional ?days= window; raises ValueError if invalid"""
+    days = request.args.get('days')
+    if days is None:
+        return None
+    days = int(days)
+    if days < 1:
+        raise ValueError('days must be positive')
+    # Windows reaching past the earliest representable date are out of range
+    try:
+        datetime.utcnow() - timedelta(days=days - 1)
+    except OverflowError:
+        raise ValueError('days is out of range')
+    return days
+
+# Helper functions for the review change feed
+def review_analytics_delta(review):
+    """Change a single new review makes to get_product_analytics"""
+    delta = {
+        'total_reviews': 1,
+        'rating_sum': review['rating'],
+        'rating_distribution': {str(review['rating']): 1},
+        'sentiment_distribution': {}
+    }
+    if review.get('sentiment_label'):
+        delta['sentiment_distribution'][review['sentiment_label']] = 1
+    return delta
+
+def product_analytics_snapshot(cursor, product_ids):
+    """get_product_analytics aggregates, plus the raw rating_sum, for each product"""
+    product_ids = list(product_ids)
+    snapshots = {}
+    # Chunk to stay under SQLite's bound parameter limit
+    for start in range(0, len(product_ids), 500):
+        chunk = product_ids[start:start + 500]
+        cursor.execute(f"""
+            SELECT product_id, rating, sentiment_label, COUNT(*)
+            FROM reviews
+            WHERE product_id IN ({','.join('?' for _ in chunk)})
+            GROUP BY product_id, rating, sentiment_label
+        """, chunk)
+
+        for product_id, rating, sentiment_label, count in cursor.fetchall():
+            snapshot = snapshots.setdefault(product_id, {
+                'product_id': product_id,
+                'total_reviews': 0,
+                'rating_sum': 0,
+                'sentiment_distribution': {'positive': 0, 'neutral': 0, 'negative': 0},
+                'rating_distribution': {'5': 0, '4': 0, '3': 0, '2': 0, '1': 0}
+            })
+            snapshot['total_reviews'] += count
+            snapshot['rating_sum'] += (rating or 0) * count
+            if sentiment_label in snapshot['sentiment_distribution']:
+                snapshot['sentiment_distribution'][sentiment_label] += count
+            if str(rating) in snapshot['rating_distribution']:
+                snapshot['rating_distribution'][str(rating)] += count
+
+    for snapshot in snapshots.values():
+        snapshot['average_rating'] = round(snapshot['rating_sum'] / snapshot['total_reviews'], 1)
+    return snapshots
+
+def publish_feed_event(event_name, payloads):
+    """Publish one event to the history and every matching subscriber.
+
+    payloads maps a product_id to the JSON its subscribers receive; the None
+    key holds the JSON sent to firehose subscribers. Callers serialise before
+    publishing so no lock is held while encoding.
+    """
+    global feed_last_event_id
+    with feed_lock:
+        feed_last_event_id += 1
+        event = (feed_last_event_id, event_name, payloads)
+        feed_history.append(event)
+
+        for subscriber in list(feed_subscribers):
+            if subscriber['product_id'] not in payloads:
+                continue
+            try:
+                subscriber['queue'].put_nowait(event)
+            except queue.Full:
+                # Slow consumer: drop it, the client resumes via Last-Event-ID
+                subscriber['evicted'] = True
+                feed_subscribers.remove(subscriber)
+
+def review_event_payloads(review, analytics):
+    """Serialized payloads for a single new review with its delta and updated aggregates"""
+    payload = json.dumps({
+        'type': 'review',
+        'product_id': review['product_id'],
+        'review': review,
+        'analytics_delta': review_analytics_delta(review),
+        'analytics': analytics
+    })
+    return {None: payload, review['product_id']: payload}
+
+def import_event_payloads(reviews, snapshots):
+    """Serialized payloads for an import, published as a single event.
+
+    One event keeps large imports from filling subscriber buffers and pushing
+    resume positions out of the history. Imports over FEED_IMPORT_REVIEW_LIMIT
+    carry only the per-product aggregates (reviews_included is false) so the
+    history stays small; clients re-fetch the reviews themselves.
+    """
+    reviews_included = len(reviews) <= FEED_IMPORT_REVIEW_LIMIT
+    products = {}
+    for review in reviews:
+        product = products.setdefault(review['product_id'], {
+            'product_id': review['product_id'],
+            'imported_reviews': 0,
+            'analytics': snapshots.get(review['product_id'])
+        })
+        product['imported_reviews'] += 1
+        if reviews_included:
+            product.setdefault('reviews', []).append(review)
+
+    payloads = {None: {
+        'type': 'import',
+        'imported_reviews': len(reviews),
+        'reviews_included': reviews_included,
+        'products': list(products.values())
+    }}
+    for product_id, product in products.items():
+        payloads[product_id] = {
+            'type': 'import',
+            'imported_reviews': product['imported_reviews'],
+            'reviews_included': reviews_included,
+            'products': [product]
+        }
+    return {key: json.dumps(payload) for key, payload in payloads.items()}
+
+def feed_event_id(seq):
+    """Public event id for a sequence number in this process"""
+    return f"{feed_epoch}-{seq}"
+
+def format_sse(event_id, data, event=None):
+    """Serialize a single Server-Sent Events message"""
+    message = ''
+    if event_id is not None:
+        message += f"id: {event_id}\n"
+    if event:
+        message += f"event: {event}\n"
+    return message + f"data: {data}\n\n"
+
+def stream_review_events(product_id, last_event):
+    """Subscribe to the change feed, replaying history after last_event (epoch, seq)"""
+    subscriber = {
+        'queue': queue.Queue(maxsize=FEED_SUBSCRIBER_BUFFER),
+        'product_id': product_id,
+        'evicted': False
+    }
+
+    # Snapshot the backlog and subscribe atomically so no event is missed or repeated
+    with feed_lock:
+        reset = False
+        backlog = []
+        last_event_id = None
+        if last_event is not None:
+            epoch, last_event_id = last_event
+            oldest_id = feed_history[0][0] if feed_history else feed_last_event_id + 1
+            reset = (
+                epoch != feed_epoch
+                or last_event_id < oldest_id - 1
+                or last_event_id > feed_last_event_id
+            )
+            if not reset:
+                backlog = [
+                    e for e in feed_history
+                    if e[0] > last_event_id and product_id in e[2]
+                ]
+        current_id = feed_last_event_id
+        feed_subscribers.append(subscriber)
+
+    def generate():
+        delivered_id = current_id if last_event_id is None or reset else last_event_id
+        try:
+            yield "retry: 3000\n"
+            if reset:
+                # History no longer covers the client's position, it must re-fetch
+                yield format_sse(feed_event_id(current_id), json.dumps({'type': 'reset'}), 'reset')
+            for event_id, event_name, payloads in backlog:
+                yield format_sse(feed_event_id(event_id), payloads[product_id], event_name)
+                delivered_id = event_id
+
+            while True:
+                if subscriber['evicted']:
+                    yield format_sse(None, json.dumps({
+                        'type': 'evicted',
+                        'last_event_id': feed_event_id(delivered_id)
+                    }), 'evicted')
+                    return
+                try:
+                    event_id, event_name, payloads = subscriber['queue'].get(timeout=FEED_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event_id <= delivered_id:
+                    continue
+                yield format_sse(feed_event_id(event_id), payloads[product_id], event_name)
+                delivered_id = event_id
+        finally:
+            with feed_lock:
+                if subscriber in feed_subscribers:
+                    feed_subscribers.remove(subscriber)
+
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+def parse_last_event_id():
+    """Read Last-Event-ID from the header or ?last_event_id= as (epoch, seq).
+
+    Raises ValueError if invalid. A bare number (no epoch) is accepted and
+    always resets, since it cannot belong to this process.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    if last_event_id is None:
+        return None
+    epoch, _, seq = last_event_id.rpartition('-')
+    return epoch, int(seq)
+
 # Service registry functions (unchanged)
 def register_with_service_registry():
     global service_id
@@ -231,7 +658,57 @@ def get_product_analytics(product_id):
         return jsonify(response)
     except ValueError:
         return jsonify({'error': 'Invalid product ID'}), 400
- 
+
+# Approximate analytics backed by mergeable per-day sketches.
+# distinct_reviewers is a HyperLogLog estimate (relative standard error ~3.25%);
+# rating quantiles come from a 1-5 star histogram and are exact.
+@app.route('/api/analytics/products/<product_id>/sketch', methods=['GET'])
+def get_product_sketch_analytics(product_id):
+    try:
+        product_id_int = int(product_id)
+    except ValueError:
+        return jsonify({'error': 'Invalid product ID'}), 400
+
+    try:
+        days = parse_window_days()
+    except ValueError:
+        return jsonify({'error': 'Invalid window, days must be a positive integer'}), 400
+
+    registers, rating_counts = merge_review_sketches([product_id_int], days)
+
+    if sum(rating_counts) == 0:
+        return jsonify({'error': 'No reviews found for this product'}), 404
+
+    response = {'product_id': product_id_int}
+    response.update(sketch_analytics_response(registers, rating_counts, days))
+    return jsonify(response)
+
+@app.route('/api/analytics/sketch', methods=['GET'])
+def get_merged_sketch_analytics():
+    # Optional comma-separated product filter, e.g. ?product_ids=1,2,3
+    product_ids = request.args.get('product_ids')
+    try:
+        if product_ids:
+            product_ids = [int(pid) for pid in product_ids.split(',')]
+        else:
+            product_ids = None
+    except ValueError:
+        return jsonify({'error': 'Invalid product ID'}), 400
+
+    try:
+        days = parse_window_days()
+    except ValueError:
+        return jsonify({'error': 'Invalid window, days must be a positive integer'}), 400
+
+    registers, rating_counts = merge_review_sketches(product_ids, days)
+
+    if sum(rating_counts) == 0:
+        return jsonify({'error': 'No reviews found'}), 404
+
+    response = {'product_ids': product_ids}
+    response.update(sketch_analytics_response(registers, rating_counts, days))
+    return jsonify(response)
+
 @app.route('/api/reviews/<review_id>', methods=['GET'])
 def get_review(review_id):
     try:
@@ -261,9 +738,24 @@ def create_review():
     # Validate input
     if not data.get('product_id') or not data.get('user_id') or not data.get('rating'):
         return jsonify({'message': 'Missing required fields'}), 400
-       
+
+    # Feed subscribers are keyed by integer product ID
+    if isinstance(data.get('product_id'), str) and data['product_id'].strip().isdigit():
+        data['product_id'] = int(data['product_id'])
+    if not is_whole_number(data.get('product_id')):
+        return jsonify({'message': 'Invalid product ID'}), 400
+    data['product_id'] = int(data['product_id'])
+
+    if not is_whole_number(data.get('rating')):
+        return jsonify({'message': 'Rating must be a whole number'}), 400
+
     if data.get('rating') < 1 or data.get('rating') > 5:
         return jsonify({'message': 'Rating must be between 1 and 5'}), 400
+
+    # Normalise 4.0 -> 4 so storage, sketches and events agree
+    data['rating'] = int(data['rating'])
+    if is_whole_number(data.get('user_id')):
+        data['user_id'] = int(data['user_id'])
        
     # Simple sentiment analysis
     sentiment_score, sentiment_label = simple_sentiment_analysis(
@@ -294,10 +786,11 @@ def create_review():
     
     # Get the ID of the new review
     review_id = cursor.lastrowid
-    
-    conn.commit()
-    conn.close()
-    
+
+    # Keep the approximate analytics sketch in step with the write
+    update_review_sketch(cursor, data.get('product_id'), data.get('user_id'), data.get('rating'), created_at)
+    analytics = product_analytics_snapshot(cursor, [data.get('product_id')])[data.get('product_id')]
+
     # Create response object
     review = {
         'id': review_id,
@@ -310,7 +803,13 @@ def create_review():
         'sentiment_label': sentiment_label,
         'created_at': created_at
     }
-   
+
+    payloads = review_event_payloads(review, analytics)
+    with feed_publish_lock:
+        conn.commit()
+        conn.close()
+        publish_feed_event('review', payloads)
+
     return jsonify(review), 201
 
 # New visualization API endpoints
@@ -614,7 +1113,29 @@ def import_reviews():
         for col in required_columns:
             if col not in df.columns:
                 return jsonify({'error': f'Missing required column: {col}'}), 400
-        
+
+        # Skip rows the reviews table cannot hold: blank or non-numeric ids,
+        # ratings outside 1-5 and unparseable dates
+        for col in required_columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+
+        if 'created_at' in df.columns:
+            df['created_at'] = df['created_at'].apply(normalize_created_at)
+
+        valid = (
+            df[required_columns].notna().all(axis=1)
+            & (df['product_id'] % 1 == 0)
+            & (df['user_id'] % 1 == 0)
+            & df['rating'].isin([1, 2, 3, 4, 5])
+        )
+        if 'created_at' in df.columns:
+            valid &= df['created_at'].notna()
+
+        skipped_rows = int((~valid).sum())
+        df = df[valid].copy()
+        for col in required_columns:
+            df[col] = df[col].astype(int)
+
         # Add missing columns with default values
         if 'username' not in df.columns:
             df['username'] = df['user_id'].apply(lambda x: f"User{x}")
@@ -639,6 +1160,7 @@ def import_reviews():
         cursor = conn.cursor()
         
         # Insert the reviews
+        imported_reviews = []
         for _, row in df.iterrows():
             cursor.execute('''
             INSERT INTO reviews (product_id, user_id, username, rating, comment, sentiment_score, sentiment_label, created_at) 
@@ -653,17 +1175,67 @@ def import_reviews():
                 row.get('sentiment_label'),
                 row.get('created_at')
             ))
-        
-        conn.commit()
-        conn.close()
-        
+            update_review_sketch(
+                cursor,
+                int(row['product_id']),
+                int(row['user_id']),
+                int(row['rating']),
+                row.get('created_at')
+            )
+            imported_reviews.append({
+                'id': cursor.lastrowid,
+                'product_id': int(row['product_id']),
+                'user_id': int(row['user_id']),
+                'username': None if pd.isna(row['username']) else row['username'],
+                'rating': int(row['rating']),
+                'comment': None if pd.isna(row.get('comment')) else row.get('comment'),
+                'sentiment_score': None if pd.isna(row.get('sentiment_score')) else row.get('sentiment_score'),
+                'sentiment_label': None if pd.isna(row.get('sentiment_label')) else row.get('sentiment_label'),
+                'created_at': None if pd.isna(row.get('created_at')) else row.get('created_at')
+            })
+
+        snapshots = product_analytics_snapshot(cursor, {r['product_id'] for r in imported_reviews})
+
+        payloads = import_event_payloads(imported_reviews, snapshots) if imported_reviews else None
+        with feed_publish_lock:
+            conn.commit()
+            conn.close()
+            if payloads:
+                publish_feed_event('import', payloads)
+
         return jsonify({
-            'message': f'Successfully imported {len(df)} reviews'
+            'message': f'Successfully imported {len(df)} reviews',
+            'skipped': skipped_rows
         })
         
     except Exception as e:
         return jsonify({'error': f'Error importing reviews: {str(e)}'}), 500
 
+# Change feed: pushes each new review with its analytics delta so clients
+# can apply it locally instead of polling the full-body endpoints
+@app.route('/api/stream/reviews', methods=['GET'])
+def stream_all_reviews():
+    try:
+        last_event = parse_last_event_id()
+    except ValueError:
+        return jsonify({'error': 'Invalid Last-Event-ID'}), 400
+
+    return stream_review_events(None, last_event)
+
+@app.route('/api/stream/reviews/product/<product_id>', methods=['GET'])
+def stream_product_reviews(product_id):
+    try:
+        product_id_int = int(product_id)
+    except ValueError:
+        return jsonify({'error': 'Invalid product ID'}), 400
+
+    try:
+        last_event = parse_last_event_id()
+    except ValueError:
+        return jsonify({'error': 'Invalid Last-Event-ID'}), 400
+
+    return stream_review_events(product_id_int, last_event)
+
 @app.errorhandler(404)
 def not_found(e):
     return jsonify({'error': 'Not found'}), 404
@@ -0,0 +1,296 @@
+"""
+Tests for the feedback service sketch analytics and review change feed
+"""
+
+import io
+import json
+import math
+import threading
+from collections import deque
+
+import pytest
+
+import app as feedback
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(feedback, 'DB_PATH', str(tmp_path / 'feedback.db'))
+    feedback.init_db()
+    return feedback.app.test_client()
+
+
+def post_review(client, product_id, user_id, rating, comment='ok'):
+    return client.post('/api/reviews', json={
+        'product_id': product_id,
+        'user_id': user_id,
+        'rating': rating,
+        'comment': comment
+    })
+
+
+# HyperLogLog accuracy: the hash is deterministic, so these are stable
+@pytest.mark.parametrize('cardinality', [10, 100, 1000, 5000, 20000])
+def test_hll_estimate_within_error_bound(cardinality):
+    registers = bytearray(feedback.HLL_REGISTERS)
+    # Each id is added twice; duplicates must not move the estimate
+    for user_id in list(range(cardinality)) * 2:
+        feedback.hll_add(registers, user_id)
+    estimate = feedback.hll_estimate(registers)
+    assert abs(estimate - cardinality) <= 3 * feedback.HLL_RELATIVE_ERROR * cardinality
+
+
+def test_hll_merge_of_disjoint_sets_matches_union():
+    left = bytearray(feedback.HLL_REGISTERS)
+    right = bytearray(feedback.HLL_REGISTERS)
+    union = bytearray(feedback.HLL_REGISTERS)
+    for user_id in range(3000):
+        feedback.hll_add(left, user_id)
+        feedback.hll_add(union, user_id)
+    for user_id in range(3000, 7000):
+        feedback.hll_add(right, user_id)
+        feedback.hll_add(union, user_id)
+
+    feedback.hll_merge(left, right)
+
+    assert left == union
+    assert abs(feedback.hll_estimate(left) - 7000) <= 3 * feedback.HLL_RELATIVE_ERROR * 7000
+
+
+def nearest_rank(values, q):
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(q * len(ordered))) - 1]
+
+
+@pytest.mark.parametrize('rating_counts', [
+    [1, 0, 0, 0, 0],
+    [1, 0, 0, 3, 6],
+    [10, 20, 30, 25, 15],
+    [0, 7, 0, 0, 93],
+])
+def test_rating_quantiles_match_nearest_rank(rating_counts):
+    ratings = [r for r, count in enumerate(rating_counts, start=1) for _ in range(count)]
+    quantiles = feedback.rating_quantiles(rating_counts)
+    for q in feedback.RATING_QUANTILES:
+        assert quantiles[f"p{int(q * 100)}"] == nearest_rank(ratings, q)
+
+
+def test_product_sketch_endpoint(client):
+    for user_id in range(1, 41):
+        post_review(client, 1, user_id % 25 + 1, user_id % 5 + 1)
+    post_review(client, 2, 99, 1)
+
+    response = client.get('/api/analytics/products/1/sketch?days=7')
+    body = response.get_json()
+
+    assert response.status_code == 200
+    assert body['total_reviews'] == 40
+    assert body['distinct_reviewers']['estimate'] == 25
+    assert body['distinct_reviewers']['relative_standard_error'] == feedback.HLL_RELATIVE_ERROR
+    assert body['rating_quantiles']['p50'] == 3
+
+
+def test_merged_sketch_endpoint(client):
+    post_review(client, 1, 1, 5)
+    post_review(client, 2, 1, 4)
+    post_review(client, 2, 2, 1)
+
+    body = client.get('/api/analytics/sketch?product_ids=1,2').get_json()
+
+    assert body['total_reviews'] == 3
+    assert body['distinct_reviewers']['estimate'] == 2
+
+
+def test_sketch_endpoints_reject_bad_input(client):
+    post_review(client, 1, 1, 5)
+
+    assert client.get('/api/analytics/products/abc/sketch').status_code == 400
+    assert client.get('/api/analytics/products/1/sketch?days=0').status_code == 400
+    assert client.get('/api/analytics/products/1/sketch?days=99999999').status_code == 400
+    assert client.get('/api/analytics/products/1/sketch?days=9999999999').status_code == 400
+    assert client.get('/api/analytics/products/1/sketch?days=730000').status_code == 200
+    assert client.get('/api/analytics/sketch?product_ids=1,x').status_code == 400
+    assert client.get('/api/analytics/products/9/sketch').status_code == 404
+    assert feedback.merge_review_sketches([], None)[1] == [0, 0, 0, 0, 0]
+
+
+def test_create_review_rejects_fractional_rating(client):
+    assert post_review(client, 1, 1, 4.5).status_code == 400
+
+    response = post_review(client, 1, 5.0, 4.0)
+    assert response.status_code == 201
+    assert response.get_json()['rating'] == 4
+    assert response.get_json()['user_id'] == 5
+
+
+# Review change feed
+@pytest.fixture
+def feed(monkeypatch):
+    monkeypatch.setattr(feedback, 'feed_history', deque(maxlen=feedback.FEED_HISTORY_SIZE))
+    monkeypatch.setattr(feedback, 'feed_subscribers', [])
+    monkeypatch.setattr(feedback, 'feed_last_event_id', 0)
+    monkeypatch.setattr(feedback, 'feed_epoch', 'boot1')
+    monkeypatch.setattr(feedback, 'FEED_HEARTBEAT_SECONDS', 1)
+
+
+def open_stream(client, url, last_event_id=None):
+    headers = {'Last-Event-ID': str(last_event_id)} if last_event_id is not None else {}
+    response = client.get(url, headers=headers)
+    chunks = iter(response.response)
+    assert next(chunks) == b'retry: 3000\n'
+    return response, chunks
+
+
+def next_event(chunks):
+    """Parse the next non-heartbeat SSE message into (id, event, data)"""
+    while True:
+        message = next(chunks).decode('utf-8')
+        if not message.startswith(':'):
+            break
+    fields = dict(line.split(': ', 1) for line in message.strip().split('\n'))
+    # Reject NaN/Infinity the way the browser's JSON.parse would
+    data = json.loads(fields['data'], parse_constant=lambda c: pytest.fail(f'invalid JSON constant {c}'))
+    return fields.get('id'), fields.get('event'), data
+
+
+def import_csv(client, text):
+    return client.post(
+        '/api/import/reviews',
+        data={'file': (io.BytesIO(text.encode('utf-8')), 'reviews.csv')},
+        content_type='multipart/form-data'
+    )
+
+
+def test_feed_filters_by_product_and_carries_aggregates(client, feed):
+    response, chunks = open_stream(client, '/api/stream/reviews/product/1')
+    post_review(client, 2, 1, 5)
+    post_review(client, 1, 1, 4)
+    post_review(client, 1, 2, 1)
+
+    assert next_event(chunks)[2]['review']['rating'] == 4
+    event_id, event, data = next_event(chunks)
+    response.close()
+
+    assert (event_id, event) == ('boot1-3', 'review')
+    assert data['product_id'] == 1
+    assert data['analytics_delta']['rating_distribution'] == {'1': 1}
+    assert data['analytics']['total_reviews'] == 2
+    assert data['analytics']['rating_sum'] == 5
+    assert data['analytics']['average_rating'] == 2.5
+
+
+def test_feed_events_carry_aggregates_in_commit_order(client, feed):
+    response, chunks = open_stream(client, '/api/stream/reviews/product/1')
+
+    def write(user_id):
+        feedback.app.test_client().post('/api/reviews', json={
+            'product_id': 1, 'user_id': user_id, 'rating': 5
+        })
+
+    threads = [threading.Thread(target=write, args=(user_id,)) for user_id in range(1, 21)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    totals = [next_event(chunks)[2]['analytics']['total_reviews'] for _ in range(20)]
+    response.close()
+
+    assert totals == list(range(1, 21))
+
+
+def test_feed_replays_after_last_event_id(client, feed):
+    for user_id in range(1, 4):
+        post_review(client, 1, user_id, 5)
+
+    response, chunks = open_stream(client, '/api/stream/reviews', last_event_id='boot1-1')
+    replayed = [next_event(chunks)[0] for _ in range(2)]
+    post_review(client, 1, 4, 5)
+    live = next_event(chunks)[0]
+    response.close()
+
+    assert replayed == ['boot1-2', 'boot1-3']
+    assert live == 'boot1-4'
+
+
+@pytest.mark.parametrize('last_event_id', ['boot1-1', 'boot1-99', '3'])
+def test_feed_resets_when_position_is_out_of_history(client, feed, monkeypatch, last_event_id):
+    monkeypatch.setattr(feedback, 'feed_history', deque(maxlen=2))
+    for user_id in range(1, 5):
+        post_review(client, 1, user_id, 5)
+
+    response, chunks = open_stream(client, '/api/stream/reviews', last_event_id=last_event_id)
+    event_id, event, data = next_event(chunks)
+    response.close()
+
+    assert (event_id, event, data) == ('boot1-4', 'reset', {'type': 'reset'})
+
+
+def test_feed_resets_after_restart(client, feed, monkeypatch):
+    for user_id in range(1, 6):
+        post_review(client, 1, user_id, 5)
+
+    # Simulate a restart: new epoch, empty history, counter back at zero
+    monkeypatch.setattr(feedback, 'feed_epoch', 'boot2')
+    monkeypatch.setattr(feedback, 'feed_history', deque(maxlen=feedback.FEED_HISTORY_SIZE))
+    monkeypatch.setattr(feedback, 'feed_last_event_id', 0)
+    for user_id in range(6, 13):
+        post_review(client, 1, user_id, 5)
+
+    response, chunks = open_stream(client, '/api/stream/reviews', last_event_id='boot1-5')
+    event_id, event, data = next_event(chunks)
+    response.close()
+
+    assert (event_id, event) == ('boot2-7', 'reset')
+
+
+def test_feed_rejects_malformed_last_event_id(client, feed):
+    assert client.get('/api/stream/reviews', headers={'Last-Event-ID': 'boot1-x'}).status_code == 400
+
+
+def test_feed_evicts_slow_consumer(client, feed, monkeypatch):
+    monkeypatch.setattr(feedback, 'FEED_SUBSCRIBER_BUFFER', 2)
+    response, chunks = open_stream(client, '/api/stream/reviews')
+    for user_id in range(1, 4):
+        post_review(client, 1, user_id, 5)
+
+    event_id, event, data = next_event(chunks)
+    response.close()
+
+    assert event == 'evicted'
+    assert data['last_event_id'] == 'boot1-0'
+    assert feedback.feed_subscribers == []
+
+
+def test_feed_publishes_import_as_one_event(client, feed, monkeypatch):
+    monkeypatch.setattr(feedback, 'FEED_SUBSCRIBER_BUFFER', 2)
+    response, chunks = open_stream(client, '/api/stream/reviews/product/1')
+    rows = ''.join(f"{1 + i % 2},{i + 1},{i % 5 + 1},\n" for i in range(10))
+    import_csv(client, 'product_id,user_id,rating,username\n' + rows)
+
+    event_id, event, data = next_event(chunks)
+    response.close()
+
+    assert event == 'import'
+    assert data['imported_reviews'] == 5
+    assert [p['product_id'] for p in data['products']] == [1]
+    assert data['products'][0]['analytics']['total_reviews'] == 5
+    assert data['reviews_included'] is True
+    assert all(review['username'] is None for review in data['products'][0]['reviews'])
+
+
+def test_feed_large_import_carries_aggregates_only(client, feed, monkeypatch):
+    monkeypatch.setattr(feedback, 'FEED_IMPORT_REVIEW_LIMIT', 5)
+    response, chunks = open_stream(client, '/api/stream/reviews')
+    rows = ''.join(f"{1 + i % 2},{i + 1},{i % 5 + 1}\n" for i in range(10))
+    import_csv(client, 'product_id,user_id,rating\n' + rows)
+
+    event_id, event, data = next_event(chunks)
+    response.close()
+
+    assert event == 'import'
+    assert data['reviews_included'] is False
+    assert data['imported_reviews'] == 10
+    assert [p['imported_reviews'] for p in data['products']] == [5, 5]
+    assert all('reviews' not in p for p in data['products'])
+    assert data['products'][0]['analytics']['total_reviews'] == 5